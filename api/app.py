@@ -1,10 +1,18 @@
 #!/usr/bin/env python3
+import gzip
+import hashlib
 import os
-import json
-from typing import Any, Dict, List
-from flask import Flask, jsonify, send_from_directory
+import signal
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterator, List, NamedTuple, Optional, Set, Tuple, TypedDict
+from flask import Flask, Response, abort, request, send_from_directory, stream_with_context
 from flasgger import Swagger
-from dataclasses import dataclass
+import orjson
+from watchdog.events import FileSystemEvent, FileSystemEventHandler
+from watchdog.observers import Observer
+from werkzeug.security import safe_join
 
 
 THIS_FILE_FOLDER = os.path.realpath(os.path.dirname(__file__))
@@ -25,55 +33,211 @@ elif app.config["ENV"] == "development":
     STATIC_FILES_HOST = "http://localhost:5000"
     APP_BASE_PATH = ""
 
+# both are fixed once the app starts, so the reports base url can be built once
+REPORTS_BASE_URL = f"{STATIC_FILES_HOST}{APP_BASE_PATH}/reports"
+REPORT_SUFFIX = ".html"
+GZ_SUFFIX = ".gz"
+GZ_REPORT_SUFFIX = REPORT_SUFFIX + GZ_SUFFIX
+# size of the chunks read and sent when decompressing a report on the fly, bigger than the default 8KiB buffer as
+# zlib spends less time per byte with bigger reads (see https://bugs.python.org/issue43317)
+GUNZIP_CHUNK_SIZE = 128 * 1024
+# how long to reuse a listing of the reports directory before scanning it again, only used while the reports directory
+# is not being watched, otherwise changes to it flush the listing right away (see ReportsChangedHandler)
+REPORTS_CACHE_TTL_SECS = 30
+# cache key of the reports snapshot while the reports directory is watched, it's only rebuilt when flushed
+WATCHED_REPORTS_CACHE_KEY = -1
+# how long browsers can cache the ui shell and the reports, published reports don't change
+INDEX_MAX_AGE_SECS = 60 * 60
+REPORT_MAX_AGE_SECS = 365 * 24 * 60 * 60
+# precompressed versions of index.html generated by the ui build, in order of preference
+INDEX_ENCODINGS = [("br", "index.html.br"), ("gzip", "index.html.gz")]
 
-@dataclass(frozen=True)
-class Report:
+
+class Report(TypedDict):
     date: str
     url: str
     name: str
     metadata: Dict[str, Any]
 
 
-def _load_reports(report_path: str = REPORTS_FOLDER) -> List[Report]:
-    reports: List[Report] = []
-    (type_dirs_path, type_dirs, _) = next(os.walk(report_path))
-    for report_type in type_dirs:
-        (_, _, report_files) = next(os.walk(os.path.join(type_dirs_path, report_type)))
+class ReportsSnapshot(NamedTuple):
+    payload: bytes
+    etag: str
+    # relative paths of the reports that have a gzipped version, without the .gz
+    gz_paths: FrozenSet[str]
+
+
+def _iter_reports(report_path: str = REPORTS_FOLDER) -> Iterator[Tuple[str, Report]]:
+    """Yields each report along with its path relative to report_path (without the .gz)."""
+    # scandir reuses the entry type returned by readdir, so there's no extra stat per entry
+    try:
+        with os.scandir(report_path) as type_entries:
+            type_dirs: List[os.DirEntry] = [entry for entry in type_entries if entry.is_dir(follow_symlinks=False)]
+    except FileNotFoundError:
+        # no reports generated yet
+        return
+    # the listing order depends on the filesystem, sort it so the payload (and its etag) is stable
+    type_dirs.sort(key=lambda entry: entry.name)
+
+    for type_dir in type_dirs:
+        report_type: str = type_dir.name
+        # the entry already carries the joined path
+        cur_dir: str = type_dir.path
+        url_prefix: str = f"{REPORTS_BASE_URL}/{report_type}/"
+        with os.scandir(cur_dir) as file_entries:
+            report_files: List[str] = [entry.name for entry in file_entries if entry.is_file(follow_symlinks=False)]
+        report_files.sort()
+        # we already have the directory listing, no need to stat to find the metadata files
+        known_files: Set[str] = set(report_files)
+
         for report_file in report_files:
-            if not report_file.endswith(".html.gz"):
+            if not report_file.endswith(GZ_REPORT_SUFFIX):
                 continue
 
-            cur_dir = f"{REPORTS_FOLDER}/{report_type}"
-            report_name = report_file.split(".html", 1)[0]
-            metadata_path = os.path.join(cur_dir, report_name + ".metadata.json")
-            if os.path.exists(metadata_path):
-                metadata = json.loads(open(metadata_path).read())
+            report_name, _, _ = report_file.partition(REPORT_SUFFIX)
+            metadata_file = report_name + ".metadata.json"
+            metadata_path = os.path.join(cur_dir, metadata_file)
+            metadata: Dict[str, Any]
+            if metadata_file in known_files:
+                with open(metadata_path, "rb") as metadata_fd:
+                    metadata = orjson.loads(metadata_fd.read())
             else:
                 metadata = {"reason": f"Unable to find metadata file {metadata_path}"}
 
-            report_date = report_name.split("_", 1)[0]
+            report_date, _, _ = report_name.partition("_")
             if not report_date.startswith("20"):
                 report_date = ""
 
-            report_url = f"{STATIC_FILES_HOST}{APP_BASE_PATH}/reports/{report_type}/{report_file}"
-            if report_url.endswith(".html.gz"):
-                report_url = report_url.rsplit(".", 1)[0]
-
-            reports.append(
-                Report(
-                    date=report_date,
-                    name=report_name,
-                    url=report_url,
-                    metadata=metadata,
-                )
-            )
+            # the url points to the uncompressed name, get_report serves the .gz transparently
+            uncompressed_file = report_file[: -len(GZ_SUFFIX)]
+            report_url = url_prefix + uncompressed_file
+
+            yield f"{report_type}/{uncompressed_file}", {
+                "date": report_date,
+                "name": report_name,
+                "url": report_url,
+                "metadata": metadata,
+            }
+
+
+# the last snapshot built, kept around after the cache is flushed so serving a report never triggers a rescan
+_last_reports_snapshot: Optional[ReportsSnapshot] = None
+
+
+@lru_cache(maxsize=1)
+def _reports_snapshot_for_key(cache_key: int) -> ReportsSnapshot:
+    """Returns the serialized reports list and its etag, cache_key is only used as the cache key."""
+    global _last_reports_snapshot
+    gz_paths: Set[str] = set()
+    serialized_reports: List[bytes] = []
+    # serialize the reports as they are found, so we don't keep them all around just to build the payload
+    for gz_path, report in _iter_reports():
+        gz_paths.add(gz_path)
+        serialized_reports.append(orjson.dumps(report))
+
+    payload = b"[" + b",".join(serialized_reports) + b"]"
+    etag = hashlib.blake2b(payload, digest_size=16).hexdigest()
+    _last_reports_snapshot = ReportsSnapshot(payload=payload, etag=etag, gz_paths=frozenset(gz_paths))
+    return _last_reports_snapshot
+
+
+def _reports_snapshot_cached() -> ReportsSnapshot:
+    if _ensure_reports_watched():
+        return _reports_snapshot_for_key(WATCHED_REPORTS_CACHE_KEY)
+
+    return _reports_snapshot_for_key(int(time.monotonic() // REPORTS_CACHE_TTL_SECS))
+
+
+class ReportsChangedHandler(FileSystemEventHandler):
+    """Flushes the reports snapshot whenever something is added, removed or changed under the reports directory.
+
+    Note that file open/close events are ignored, as those are triggered by serving the reports themselves.
+    """
+
+    def _flush(self, event: FileSystemEvent) -> None:
+        _reports_snapshot_for_key.cache_clear()
+
+    on_created = on_deleted = on_modified = on_moved = _flush
+
+
+def _watch_reports(report_path: str = REPORTS_FOLDER) -> Observer:
+    observer = Observer()
+    observer.schedule(ReportsChangedHandler(), report_path, recursive=True)
+    observer.daemon = True
+    observer.start()
+    return observer
 
-    return reports
+
+# the process the observer was started in (or failed to), threads are not inherited when the server forks workers (ex.
+# gunicorn --preload), so each worker has to start its own
+_reports_observer_pid: Optional[int] = None
+_reports_watched = False
+_reports_observer_lock = threading.Lock()
+
+
+def _ensure_reports_watched() -> bool:
+    """Starts watching the reports directory, once per process, and returns whether it's being watched.
+
+    Until the reports directory exists, or if the observer fails to start, it's not watched and changes are only
+    picked up after REPORTS_CACHE_TTL_SECS.
+    """
+    global _reports_observer_pid, _reports_watched
+    if _reports_observer_pid == os.getpid():
+        return _reports_watched
+
+    with _reports_observer_lock:
+        if _reports_observer_pid == os.getpid():
+            return _reports_watched
+
+        if not os.path.isdir(REPORTS_FOLDER):
+            return False
+
+        try:
+            _watch_reports()
+            _reports_watched = True
+        except OSError as error:
+            # ex. out of inotify watches, not worth failing the listing for it
+            app.logger.warning(f"Unable to watch {REPORTS_FOLDER}, refreshing the reports periodically: {error}")
+            _reports_watched = False
+
+        # anything cached before (ex. by the parent process) was not being watched
+        _reports_snapshot_for_key.cache_clear()
+        _reports_observer_pid = os.getpid()
+        if _reports_watched:
+            # scan right away, so the first listing request does not have to
+            _reports_snapshot_for_key(WATCHED_REPORTS_CACHE_KEY)
+
+        return _reports_watched
+
+
+def _flush_reports_on_signal(signum: int, frame: Any) -> None:
+    _reports_snapshot_for_key.cache_clear()
+
+
+# `kill -HUP <pid>` forces the reports list to be reloaded on the next request, signal handlers can only be set from the
+# main thread, which some WSGI servers don't load the app from
+if threading.current_thread() is threading.main_thread():
+    signal.signal(signal.SIGHUP, _flush_reports_on_signal)
+
+# start watching (and scanning) the reports when the app is loaded, forked workers do it again on their first request
+_ensure_reports_watched()
 
 
 @app.route("/")
 def index():
-    return send_from_directory(APP_FOLDER, "index.html")
+    for encoding, index_file in INDEX_ENCODINGS:
+        # checked on each request, the ui might be rebuilt while the app is running
+        if encoding in request.accept_encodings and os.path.exists(os.path.join(APP_FOLDER, index_file)):
+            response = send_from_directory(
+                APP_FOLDER, index_file, mimetype="text/html", max_age=INDEX_MAX_AGE_SECS, conditional=True
+            )
+            response.headers["Content-Encoding"] = encoding
+            break
+    else:
+        response = send_from_directory(APP_FOLDER, "index.html", max_age=INDEX_MAX_AGE_SECS, conditional=True)
+
+    response.vary.add("Accept-Encoding")
+    return response
 
 
 @app.route("/api/v1/reports/")
@@ -104,17 +268,49 @@ def reports():
         examples:
     """
 
-    return jsonify(_load_reports())
+    snapshot = _reports_snapshot_cached()
+    response = Response(snapshot.payload, mimetype="application/json")
+    response.set_etag(snapshot.etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = REPORTS_CACHE_TTL_SECS
+    # replies with a 304 if the client already has this etag
+    return response.make_conditional(request)
+
+
+def _iter_gunzipped(gz_path: str) -> Iterator[bytes]:
+    with open(gz_path, "rb", buffering=GUNZIP_CHUNK_SIZE) as raw_fd, gzip.GzipFile(fileobj=raw_fd) as gz_fd:
+        while chunk := gz_fd.read(GUNZIP_CHUNK_SIZE):
+            yield chunk
 
 
 @app.route("/reports/<path:path>")
 def get_report(path: str):
-    full_gz_path = f"{REPORTS_FOLDER}/{path}.gz"
-    if os.path.exists(full_gz_path):
-        response = send_from_directory(REPORTS_FOLDER, path + ".gz")
+    full_gz_path = safe_join(REPORTS_FOLDER, path + GZ_SUFFIX)
+    if full_gz_path is None:
+        abort(404)
+
+    # known reports skip the stat, reports newer than the last snapshot (or not reports at all) are checked on disk
+    snapshot = _last_reports_snapshot
+    is_known_report = snapshot is not None and path in snapshot.gz_paths
+    if not is_known_report and not os.path.exists(full_gz_path):
+        return send_from_directory(REPORTS_FOLDER, path, max_age=REPORT_MAX_AGE_SECS, conditional=True)
+
+    if "gzip" in request.accept_encodings:
+        # ship the compressed bytes untouched (sendfile-able), the client does the decompression
+        response = send_from_directory(
+            REPORTS_FOLDER,
+            path + GZ_SUFFIX,
+            mimetype="text/html",
+            max_age=REPORT_MAX_AGE_SECS,
+            conditional=True,
+            etag=True,
+        )
+        response.headers["Content-Encoding"] = "gzip"
     else:
-        response = send_from_directory(REPORTS_FOLDER, path)
+        # stream it decompressed, so we don't have to hold the whole report in memory
+        response = Response(stream_with_context(_iter_gunzipped(full_gz_path)), mimetype="text/html")
 
+    response.vary.add("Accept-Encoding")
     return response
 
 
@@ -0,0 +1,19 @@
+/* eslint-disable @typescript-eslint/no-var-requires */
+// Writes gzip and brotli versions of the built index.html, so the api can serve them without compressing on the fly.
+const fs = require('fs');
+const path = require('path');
+const zlib = require('zlib');
+
+const indexPath = path.join(__dirname, '..', 'build', 'index.html');
+const index = fs.readFileSync(indexPath);
+
+fs.writeFileSync(`${indexPath}.gz`, zlib.gzipSync(index, { level: zlib.constants.Z_BEST_COMPRESSION }));
+fs.writeFileSync(
+    `${indexPath}.br`,
+    zlib.brotliCompressSync(index, {
+        params: {
+            [zlib.constants.BROTLI_PARAM_QUALITY]: zlib.constants.BROTLI_MAX_QUALITY,
+            [zlib.constants.BROTLI_PARAM_SIZE_HINT]: index.length,
+        },
+    })
+);
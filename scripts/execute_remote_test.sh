@@ -118,21 +118,29 @@ main() {
         user="root@"
     fi
 
+    # reuse a single connection for all the ssh/scp calls, same as remote_host.py
+    # (ssh expands the ~ itself, so keep it quoted)
+    local ssh_opts=(
+        -o ControlMaster=auto
+        -o "ControlPath=~/.ssh/cloud-perf-%C"
+        -o ControlPersist=60s
+    )
+
     echo "Executing $stack_level tests ($script_file) on ${user}${remote_host}, and storing in $results_dir..."
     local full_script_path="$(dirname $(realpath $0))/$script_file"
-    scp "$full_script_path" "${user}${remote_host}:."
-    ssh "${user}${remote_host}" \
+    scp "${ssh_opts[@]}" "$full_script_path" "${user}${remote_host}:."
+    ssh "${ssh_opts[@]}" "${user}${remote_host}" \
         $sudo_cmd chown -R "$USER" perf_test_results 2>/dev/null || :
-    ssh "${user}${remote_host}" \
+    ssh "${ssh_opts[@]}" "${user}${remote_host}" \
         rm -rf perf_test_results
-    ssh "${user}${remote_host}" \
+    ssh "${ssh_opts[@]}" "${user}${remote_host}" \
         $sudo_cmd ./"$script_file"  \
         --outdir perf_test_results \
         --num-passes "$num_passes" \
         "$@"
-    ssh "${user}${remote_host}" \
+    ssh "${ssh_opts[@]}" "${user}${remote_host}" \
         $sudo_cmd chown -R "$USER" perf_test_results
-    scp -r "${user}${remote_host}:perf_test_results" "$results_dir"
+    scp "${ssh_opts[@]}" -r "${user}${remote_host}:perf_test_results" "$results_dir"
 
 
     cat > "$results_dir/metadata.json" <<EOM
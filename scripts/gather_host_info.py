@@ -11,13 +11,14 @@ from typing import Any, Callable, Dict, List, Optional
 from enum import Enum
 import subprocess
 
-from generate_reports import StackLevel
+from generate_reports import STACK_LEVEL_NAMES, StackLevel
 from get_hosts_from_netbox import (
     load_config_file,
-    get_hosts,
+    get_hosts_cached,
     device_to_str,
     EntityType,
 )
+from remote_host import SSH_OPTIONS, run_when_ready
 
 
 class Site(Enum):
@@ -25,6 +26,9 @@ class Site(Enum):
     eqiad = "eqiad1"
 
 
+SITE_NAMES = tuple(site.name for site in Site)
+
+
 def check_call(command: List[str]) -> int:
     logging.debug(f"Running command {command}")
     return subprocess.check_call(command)
@@ -34,23 +38,31 @@ def get_random_netbox_host(
     hosts_query: str, site: Site, domain: Optional[str] = None
 ) -> List[str]:
     netbox_config = load_config_file()
-    all_matching_hosts = [
-        device_to_str(device_dict, domain=domain)
-        for device_dict in get_hosts(
-            netbox_url=netbox_config["netbox_url"],
-            api_token=netbox_config["api_token"],
-            entity_type=EntityType.devices,
-            search_query=hosts_query,
-        )
-        if device_dict["site"]["slug"] == site.name
-    ]
-    if len(all_matching_hosts) < 1:
+    # pick one of the matching devices uniformly in a single pass (reservoir
+    # sampling), so we only build the name of the chosen one
+    chosen_device = None
+    num_matching = 0
+    # the stack levels (and the openstack control host) might query the
+    # same hosts
+    for device_dict in get_hosts_cached(
+        netbox_url=netbox_config["netbox_url"],
+        api_token=netbox_config["api_token"],
+        entity_type=EntityType.devices,
+        search_query=hosts_query,
+    ):
+        if device_dict["site"]["slug"] != site.name:
+            continue
+
+        num_matching += 1
+        if random.randrange(num_matching) == 0:
+            chosen_device = device_dict
+
+    if chosen_device is None:
         raise Exception(
             f"Unable to get enough hosts matching '{hosts_query}' for site "
-            f"'{site.name}', need 1 but got "
-            f"{len(all_matching_hosts)}."
+            f"'{site.name}', need 1 but got {num_matching}."
         )
-    return random.choice(all_matching_hosts)
+    return device_to_str(chosen_device, domain=domain)
 
 
 def get_os_run(
@@ -67,6 +79,7 @@ def get_os_run(
     def _run_os(*command_args):
         command = [
             "ssh",
+            *SSH_OPTIONS,
             control_host,
             "sudo",
             "wmcs-openstack",
@@ -87,10 +100,17 @@ def get_performance_vm(site: Site) -> List[str]:
     performance_vm_name = "performance-test"
     performance_project = "testlabs"
     os_run = get_os_run(project=performance_project, site=site)
+    # let openstack do the filtering, instead of listing all the project VMs
+    list_performance_vm_args = (
+        "server",
+        "list",
+        "--name",
+        f"^{performance_vm_name}$",
+    )
     performance_vm_info = next(
         (
             vm_info["Name"]
-            for vm_info in os_run("server", "list")
+            for vm_info in os_run(*list_performance_vm_args)
             if vm_info["Name"] == performance_vm_name
         ),
         None,
@@ -118,42 +138,32 @@ def get_performance_vm(site: Site) -> List[str]:
             "--wait",
         )
 
-        waitfor = 60 * 15  # 15 minutes
-        ran_puppet = False
-        start_time = time.time()
-        while not ran_puppet:
-            try:
-                check_call(
-                    [
-                        "ssh",
-                        performance_vm_fqdn,
-                        "sudo",
-                        "run-puppet-agent",
-                    ]
-                )
-            except Exception:
-                cur_time = time.time()
-                if (cur_time - start_time) > waitfor:
-                    logging.error(
-                        f"Unable to spin up the vm {performance_vm_name} "
-                        f"(project: {performance_project}, "
-                        f"site: {site.name}), timed out waiting for puppet to "
-                        "run."
-                    )
-                    raise
-
-                logging.info(
-                    f"Waiting for the VM {performance_vm_fqdn} to come online "
-                    "and do a full puppet run..."
-                )
-                time.sleep(60)
-                continue
-
-            ran_puppet = True
+        logging.info(
+            f"Waiting for the VM {performance_vm_fqdn} to come online "
+            "and do a full puppet run..."
+        )
+        # only runs puppet once the VM is reachable, instead of using the
+        # (slow) puppet run itself to probe for it
+        deadline = time.monotonic() + 60 * 15  # 15 minutes
+        try:
+            run_when_ready(
+                host=performance_vm_fqdn,
+                command=["sudo", "run-puppet-agent"],
+                deadline=deadline,
+            )
+        except Exception:
+            logging.error(
+                f"Unable to spin up the vm {performance_vm_name} "
+                f"(project: {performance_project}, "
+                f"site: {site.name}), timed out waiting for puppet to "
+                "run."
+            )
+            raise
 
         check_call(
             [
                 "ssh",
+                *SSH_OPTIONS,
                 performance_vm_fqdn,
                 "sudo",
                 "apt",
@@ -227,14 +237,14 @@ STACK_LEVEL_CONFIG_PER_SITE = {
     "-s",
     "--site-name",
     required=True,
-    type=click.Choice([site.name for site in Site]),
+    type=click.Choice(SITE_NAMES),
 )
 @click.option(
     "-l",
     "--stack-level",
     multiple=True,
-    default=[stack_level.name for stack_level in StackLevel],
-    type=click.Choice([stack_level.name for stack_level in StackLevel]),
+    default=STACK_LEVEL_NAMES,
+    type=click.Choice(STACK_LEVEL_NAMES),
 )
 @click.option(
     "-v",
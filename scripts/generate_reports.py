@@ -34,31 +34,72 @@ For example:
                     └── run_stats.log.gz
 """
 import datetime
-import gzip
+import io
 import json
 import logging
 import os
-from copy import copy
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
 from dataclasses import dataclass
 from enum import Enum, auto
+from functools import cached_property, partial
 from math import sqrt
+from operator import gt, lt
 from posixpath import splitext
 from pprint import pformat
-from typing import Any, Callable, Iterator, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional
 
 import click
 import numpy as np
+from bokeh import __version__ as bokeh_version
 from bokeh.io import curdoc, output_file
+from bokeh.io.state import curstate
 from bokeh.layouts import column
-from bokeh.models import Div, HoverTool, Panel, Plot, Tabs
+from bokeh.models import Div, Panel, Plot, Tabs
 from bokeh.plotting import Figure, figure, gridplot, show
-from numpy.typing import ArrayLike
+from bokeh.resources import Resources
+
+try:
+    # much faster than the standard library parser for the fio output
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+try:
+    from orjson import OPT_INDENT_2, dumps as orjson_dumps
+
+    def json_dumps_indented(data: Any) -> bytes:
+        return orjson_dumps(data, option=OPT_INDENT_2)
+
+except ImportError:
+
+    def json_dumps_indented(data: Any) -> bytes:
+        return json.dumps(data, indent=2).encode()
+
+try:
+    # Intel's ISA-L implementation, a few times faster than zlib
+    from isal.igzip import decompress as gunzip
+except ImportError:
+    from gzip import decompress as gunzip
 
 NO_SAMPLES = -1
 NANO_TO_MILI = 1 / (1000 * 1000)
 KILO_TO_MEGA = 1 / 1024
 MEGA_TO_BYTE = 1024 * 1024
 KILO_TO_BYTE = 1024
+# we get ms, we want deciseconds (10 buckets/second)
+BUCKETS_PER_SEC = 10
+# buckets per second, for 60 sec test duration, plus some (tests might end
+# right after 60s)
+MAX_BUCKET = 60 * BUCKETS_PER_SEC + 10
+# kept as an int so the bucket math stays in integers
+BUCKET_MS = 1000 // BUCKETS_PER_SEC
+# the values of each report are indexed by bucket, so this is the same for all
+BUCKETS = np.arange(MAX_BUCKET + 1, dtype=np.int32)
+# threads used to load the results, most of the work is reading and
+# decompressing files
+LOAD_WORKERS = 8
 DEFAULT_BACKGROUND = (37, 37, 37)
 DEFAULT_STYLE = {
     "color": "rgb(231, 231, 231)",
@@ -72,6 +113,35 @@ class Stat(Enum):
     iops = auto()
 
 
+# for the command line options
+STAT_NAMES = tuple(stat.name for stat in Stat)
+# from the units fio logs each stat in, to the ones we show
+STAT_SCALES = {
+    Stat.latency: NANO_TO_MILI,
+    Stat.bandwidth: KILO_TO_MEGA,
+    Stat.iops: 1,
+}
+# units the stats are shown in, after scaling
+STAT_UNITS = {
+    Stat.latency: "ms",
+    Stat.bandwidth: "Mb/s",
+    Stat.iops: "iops",
+}
+# y axis label of the graphs of each stat
+STAT_Y_LABELS = {
+    Stat.latency: "latency(ms)",
+    Stat.bandwidth: "bandwidth(MiB/s)",
+    Stat.iops: "iops",
+}
+# compares the base and target values, lower latency is better, higher
+# bandwidth and iops are better
+STAT_BASE_IS_BETTER = {
+    Stat.latency: lt,
+    Stat.bandwidth: gt,
+    Stat.iops: gt,
+}
+
+
 class AggregationType(Enum):
     max = auto()
     min = auto()
@@ -98,6 +168,7 @@ class StackLevel(Enum):
     vm_disk = auto()
 
 
+STACK_LEVEL_NAMES = tuple(stack_level.name for stack_level in StackLevel)
 STACK_LEVEL_DESCS = {
     StackLevel.rbd_from_osd: (
         "RBD from OSD: This test ran against the full cluster (using librbd) "
@@ -115,6 +186,24 @@ STACK_LEVEL_DESCS = {
     ),
 }
 
+# ways of including BokehJS in the generated reports (see bokeh.resources)
+JS_MODES = ("inline", "cdn", "relative")
+# where the relative js mode copies BokehJS to, next to the reports
+BOKEHJS_DIR = f"bokehjs-{bokeh_version}"
+# the stats shown in the comparison table of each stat, in order
+STAT_TABLE_ROWS = ("mean", "max", "min", "stddev")
+STAT_TABLE_TEMPLATE = """
+        {stat_name} - {config}
+        <table width="100%">
+            <tr>
+                <th></th>
+                <th style="color:blue;">{base_name}</th>
+                <th style="color:red;">{target_name}</th>
+            </tr>
+            {rows}
+        </table>
+        <div style="color:grey;">*As given by fio</div>
+        """
 COMMON_DESC = """<div>The details in the configuration mean:
 <ul>
 <li>
@@ -145,6 +234,28 @@ Each graph shows two sets of colored lines, corresponidng to each comparison
 side. Each set has three lines, the maximum of all the runs, the mean of all
 the runs and the minimum for all the runs for that configuration and date.
 """
+# full description shown at the top of each stack level tab
+STACK_LEVEL_DIV_TEXTS = {
+    stack_level: stack_level_desc + COMMON_DESC
+    for stack_level, stack_level_desc in STACK_LEVEL_DESCS.items()
+}
+
+
+def dump_json_file(data: Any, file_path: str) -> None:
+    with open(file_path, "wb") as json_fd:
+        json_fd.write(json_dumps_indented(data))
+
+
+def load_json_file(file_path: str) -> Dict[str, Any]:
+    with open(file_path, "rb") as json_fd:
+        raw_json = json_fd.read()
+
+    # the files are small, decompressing them in one go is faster than
+    # streaming
+    if file_path.endswith(".gz"):
+        raw_json = gunzip(raw_json)
+
+    return json_loads(raw_json)
 
 
 @dataclass
@@ -156,12 +267,11 @@ class RunConfig:
 
     @classmethod
     def from_file(cls, file_path: str) -> "RunConfig":
-        if file_path.endswith(".gz"):
-            open_fn = gzip.open
-        else:
-            open_fn = open
+        return cls.from_dict(config_dict=load_json_file(file_path))
 
-        config_dict = json.load(open_fn(file_path))
+    @classmethod
+    def from_dict(cls, config_dict: Dict[str, Any]) -> "RunConfig":
+        """Builds the config from the already parsed fio json output."""
         rw = ReadWriteType[config_dict["jobs"][0]["job options"]["rw"]]
         raw_bs = config_dict["jobs"][0]["job options"]["bs"].lower()
         if "m" in raw_bs:
@@ -199,6 +309,8 @@ class BaseStats:
     min: int
     mean: float
     stddev: float
+    # how many samples the mean and stddev were computed from
+    num_samples: int
     # only set for latency
     ninety_percentile: int = 0
 
@@ -211,12 +323,11 @@ class RunStats:
 
     @classmethod
     def from_file(cls, file_path: str) -> "RunStats":
-        if file_path.endswith(".gz"):
-            open_fn = gzip.open
-        else:
-            open_fn = open
+        return cls.from_dict(stats_dict=load_json_file(file_path))
 
-        stats_dict = json.load(open_fn(file_path))
+    @classmethod
+    def from_dict(cls, stats_dict: Dict[str, Any]) -> "RunStats":
+        """Builds the stats from the already parsed fio json output."""
         job_dict = stats_dict["jobs"][0]
         if job_dict["job options"]["rw"] in ["read", "randread"]:
             stats_dict = job_dict["read"]
@@ -231,6 +342,11 @@ class RunStats:
             ninety_percentile=(
                 stats_dict["clat_ns"]["percentile"]["90.000000"] * NANO_TO_MILI
             ),
+            # older fio versions don't report N, but there's one completion
+            # latency per io
+            num_samples=stats_dict["clat_ns"].get(
+                "N", stats_dict["total_ios"]
+            ),
             stat=Stat.latency,
         )
         bandwidth = BaseStats(
@@ -238,6 +354,7 @@ class RunStats:
             min=stats_dict["bw_min"] * KILO_TO_MEGA,
             mean=stats_dict["bw_mean"] * KILO_TO_MEGA,
             stddev=stats_dict["bw_dev"] * KILO_TO_MEGA,
+            num_samples=stats_dict["bw_samples"],
             stat=Stat.bandwidth,
         )
         iops = BaseStats(
@@ -245,6 +362,7 @@ class RunStats:
             min=stats_dict["iops_min"],
             mean=stats_dict["iops_mean"],
             stddev=stats_dict["iops_stddev"],
+            num_samples=stats_dict["iops_samples"],
             stat=Stat.iops,
         )
         return cls(
@@ -256,7 +374,7 @@ class RunStats:
 
 @dataclass
 class StatReport:
-    data: ArrayLike
+    values: np.ndarray
     stat: Stat
 
     @classmethod
@@ -272,11 +390,8 @@ class StatReport:
                 f"Unable to guess report type for file {file_path}."
             )
 
-        data = np.fromiter(
-            iter_data(file_path=file_path, stat=stat),
-            dtype="i,f",
-        )
-        return cls(data=data, stat=stat)
+        values = load_data(file_path=file_path, stat=stat)
+        return cls(values=values, stat=stat)
 
     def __eq__(self, other) -> bool:
         return self.stat == other.stat
@@ -285,12 +400,14 @@ class StatReport:
         return self.__str__()
 
     def __str__(self) -> str:
-        return f"StatReport(stat={self.stat}, len(data)={len(self.data)})"
+        return (
+            f"StatReport(stat={self.stat}, len(values)={len(self.values)})"
+        )
 
 
 @dataclass
 class AggregatedRunStatReport:
-    data: ArrayLike
+    values: np.ndarray
     stat: Stat
     aggregation_type: AggregationType
     num_merged_reports: int = 1
@@ -302,7 +419,7 @@ class AggregatedRunStatReport:
         aggregation_type: AggregationType,
     ) -> "AggregatedRunStatReport":
         return cls(
-            data=stat_report.data.copy(),
+            values=stat_report.values.copy(),
             stat=stat_report.stat,
             aggregation_type=aggregation_type,
         )
@@ -315,11 +432,38 @@ class AggregatedRunStatReport:
 
     def __str__(self) -> str:
         return (
-            f"StatReport(stat={self.stat}, len(data)={len(self.data)}, "
+            f"StatReport(stat={self.stat}, len(values)={len(self.values)}, "
             f"num_merged_reports={self.num_merged_reports})"
         )
 
-    def add_stat_report(self, stat_report: StatReport) -> None:
+    @cached_property
+    def has_samples(self) -> np.ndarray:
+        return self.values != NO_SAMPLES
+
+    @cached_property
+    def plot_x(self) -> np.ndarray:
+        """Time in seconds of the buckets with samples."""
+        return BUCKETS[self.has_samples] / BUCKETS_PER_SEC
+
+    @cached_property
+    def plot_y(self) -> np.ndarray:
+        """Values of the buckets with samples."""
+        return self.values[self.has_samples]
+
+    def _clear_cached_properties(self) -> None:
+        for cached_name in ("has_samples", "plot_x", "plot_y"):
+            self.__dict__.pop(cached_name, None)
+
+    def add_stat_report(
+        self,
+        stat_report: StatReport,
+        report_has_samples: Optional[np.ndarray] = None,
+    ) -> None:
+        """Merges the stat report values into this aggregation.
+
+        report_has_samples is the mask of the buckets of the stat report that
+        have samples, it's computed if not passed.
+        """
         if stat_report.stat != self.stat:
             raise Exception(
                 f"Unable to merge a report of statistic {stat_report.stat} "
@@ -327,51 +471,45 @@ class AggregatedRunStatReport:
             )
 
         self.num_merged_reports += 1
+        # work in place, no need to copy the arrays around
+        self_values = self.values
+        report_values = stat_report.values
+        # fills up our missing buckets with the report's data if it's there
+        np.copyto(self_values, report_values, where=self_values == NO_SAMPLES)
+        # and keeps our data where the report has no samples
+        if report_has_samples is None:
+            report_has_samples = report_values != NO_SAMPLES
+
         if self.aggregation_type == AggregationType.max:
-            sanitized_self_data = self.data["f1"].copy()
-            sanitized_report_data = stat_report.data["f1"].copy()
-            # fills up each other with the other's data if it's there
-            sanitized_self_data[
-                sanitized_self_data == NO_SAMPLES
-            ] = sanitized_report_data[sanitized_self_data == NO_SAMPLES]
-            sanitized_report_data[
-                sanitized_report_data == NO_SAMPLES
-            ] = sanitized_self_data[sanitized_report_data == NO_SAMPLES]
-            self.data["f1"] = np.maximum(
-                sanitized_self_data, sanitized_report_data
+            np.maximum(
+                self_values,
+                report_values,
+                out=self_values,
+                where=report_has_samples,
             )
 
         elif self.aggregation_type == AggregationType.min:
-            sanitized_self_data = self.data["f1"].copy()
-            sanitized_report_data = stat_report.data["f1"].copy()
-            # fills up each other with the other's data if it's there
-            sanitized_self_data[
-                sanitized_self_data == NO_SAMPLES
-            ] = sanitized_report_data[sanitized_self_data == NO_SAMPLES]
-            sanitized_report_data[
-                sanitized_report_data == NO_SAMPLES
-            ] = sanitized_self_data[sanitized_report_data == NO_SAMPLES]
-            self.data["f1"] = np.minimum(
-                sanitized_self_data, sanitized_report_data
+            np.minimum(
+                self_values,
+                report_values,
+                out=self_values,
+                where=report_has_samples,
             )
 
         elif self.aggregation_type == AggregationType.mean:
-            sanitized_self_data = self.data["f1"].copy()
-            sanitized_report_data = stat_report.data["f1"].copy()
-            # fills up each other with the other's data if it's there
-            sanitized_self_data[
-                sanitized_self_data == NO_SAMPLES
-            ] = sanitized_report_data[sanitized_self_data == NO_SAMPLES]
-            sanitized_report_data[
-                sanitized_report_data == NO_SAMPLES
-            ] = sanitized_self_data[sanitized_report_data == NO_SAMPLES]
-
-            self.data["f1"] = (
-                sanitized_self_data
-                - sanitized_self_data / self.num_merged_reports
-                + sanitized_report_data / self.num_merged_reports
+            # mean = cur_mean + (new_value - cur_mean) / num_merged_reports
+            mean_deltas = report_values - self_values
+            mean_deltas /= self.num_merged_reports
+            np.add(
+                self_values,
+                mean_deltas,
+                out=self_values,
+                where=report_has_samples,
             )
 
+        # the values changed, so anything derived from them is outdated
+        self._clear_cached_properties()
+
 
 @dataclass
 class RunReport:
@@ -418,12 +556,10 @@ class RunReport:
                 os.path.join(dir_path, "data_iops.log.gz")
             )
 
-        run_config = RunConfig.from_file(
-            os.path.join(dir_path, "run_stats.log.gz")
-        )
-        run_stats = RunStats.from_file(
-            os.path.join(dir_path, "run_stats.log.gz")
-        )
+        # both the config and the stats come from the same file
+        fio_output = load_json_file(os.path.join(dir_path, "run_stats.log.gz"))
+        run_config = RunConfig.from_dict(config_dict=fio_output)
+        run_stats = RunStats.from_dict(stats_dict=fio_output)
         return cls(
             latency_report=latency_report,
             bandwidth_report=bandwidth_report,
@@ -467,7 +603,10 @@ class AggregatedRunReport:
     num_merged_reports: int = 0
 
     def _add_report(
-        self, aggregation_type: AggregationType, report: StatReport
+        self,
+        aggregation_type: AggregationType,
+        report: StatReport,
+        report_has_samples: np.ndarray,
     ) -> None:
         report_name = f"{aggregation_type.name}_{report.stat.name}_report"
         if not getattr(self, report_name):
@@ -479,18 +618,27 @@ class AggregatedRunReport:
                 ),
             )
         else:
-            getattr(self, report_name).add_stat_report(report)
+            getattr(self, report_name).add_stat_report(
+                stat_report=report, report_has_samples=report_has_samples
+            )
 
     def _add_aggregation_reports(self, report: Optional[StatReport]) -> None:
         if not report:
             return
 
+        # the same for all the aggregation types, so compute it only once
+        report_has_samples = report.values != NO_SAMPLES
         for aggregation_type in AggregationType:
-            self._add_report(aggregation_type=aggregation_type, report=report)
+            self._add_report(
+                aggregation_type=aggregation_type,
+                report=report,
+                report_has_samples=report_has_samples,
+            )
 
     def _add_aggregated_stats(self, run_stats: RunStats) -> None:
         if self.aggregated_stats is None:
-            self.aggregated_stats = copy(run_stats)
+            # deep, so aggregating does not change the stats of the run
+            self.aggregated_stats = deepcopy(run_stats)
             return
 
         for stat in Stat:
@@ -500,34 +648,46 @@ class AggregatedRunReport:
 
     def _add_aggregated_stat_stats(self, stats: BaseStats) -> None:
         my_stat = getattr(self.aggregated_stats, stats.stat.name)
+        cur_n = my_stat.num_samples
+        new_n = stats.num_samples
+        # fio reports no samples for runs too short to get any, skip those,
+        # and if we have none ourselves just take the new stats as they are
+        if new_n == 0:
+            return
+
+        if cur_n == 0:
+            setattr(self.aggregated_stats, stats.stat.name, deepcopy(stats))
+            return
 
         my_stat.max = max(my_stat.max, stats.max)
         my_stat.min = min(my_stat.min, stats.min)
-        # This avoids overflowing to some extent. Things to note:
-        # * we are giving the same weight to each run
-        # * this is the mean of the means of the runs
-        # * num_runs includes the current run
+        # Combine the mean and stddev as if all the samples of both sides had
+        # been gathered in a single run (Chan et al. parallel algorithm), this
+        # weights each run by its number of samples and stays numerically
+        # stable:
         #
-        #   mean = (cur_mean * (num_runs - 1) + new_run_mean) / num_runs
-        #   => mean = (
-        #          cur_mean * num_runs - cur_mean + new_run_mean
-        #      ) / num_runs
-        #   => mean = cur_mean - cur_mean / num_runs + new_run_mean / num_runs
+        #   delta = new_mean - cur_mean
+        #   mean = cur_mean + delta * new_n / n
+        #   m2 = cur_m2 + new_m2 + delta^2 * cur_n * new_n / n
+        #   stddev = sqrt(m2 / (n - 1))
         #
-        my_stat.mean = (
-            my_stat.mean
-            - my_stat.mean / self.num_merged_reports
-            + stats.mean / self.num_merged_reports
+        # where m2 is the sum of squared differences from the mean, that is
+        # stddev^2 * (n - 1).
+        num_samples = cur_n + new_n
+        delta = stats.mean - my_stat.mean
+        sum_sq_diffs = (
+            my_stat.stddev ** 2 * (cur_n - 1)
+            + stats.stddev ** 2 * (new_n - 1)
+            + delta ** 2 * cur_n * new_n / num_samples
         )
 
-        # For the stddev, the way of aggregating is by summing the variance
-        # and then doing the square root to get the stddev again.
-        #    stddev = sqrt(stddev1^2 + stddev2^2)
-        my_stat.stddev = sqrt(my_stat.stddev ** 2 + stats.stddev ** 2)
+        my_stat.mean += delta * new_n / num_samples
+        # the sample stddev is not defined for a single sample
+        if num_samples > 1:
+            my_stat.stddev = sqrt(sum_sq_diffs / (num_samples - 1))
+        my_stat.num_samples = num_samples
 
     def add_run_report(self, run_report: RunReport) -> None:
-        # if moving this increment after adding aggregated stats, change the
-        # mean calculation
         self.num_merged_reports += 1
         self._add_aggregation_reports(run_report.bandwidth_report)
         self._add_aggregation_reports(run_report.iops_report)
@@ -555,14 +715,20 @@ class ConfigReport:
         (see RunReport.from_dir).
         """
         aggregated_run_report = AggregatedRunReport()
-        runs = []
-        for run_dir in os.listdir(dir_path):
-            if not os.path.isdir(os.path.join(dir_path, run_dir)):
-                continue
-
-            run = RunReport.from_dir(
-                dir_path=os.path.join(dir_path, run_dir), stats=stats
+        run_dirs = [
+            os.path.join(dir_path, run_dir)
+            for run_dir in os.listdir(dir_path)
+            if os.path.isdir(os.path.join(dir_path, run_dir))
+        ]
+        with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as executor:
+            loaded_runs = list(
+                executor.map(
+                    partial(RunReport.from_dir, stats=stats), run_dirs
+                )
             )
+
+        runs = []
+        for run in loaded_runs:
             if runs:
                 if run.run_config != runs[0].run_config:
                     raise Exception(
@@ -576,7 +742,14 @@ class ConfigReport:
         if not runs:
             raise Exception("Unable to load any runs.")
 
-        runs.sort(key=str)
+        # order them by run directory, formatting the whole reports just to
+        # compare them is expensive
+        runs = [
+            run
+            for _, run in sorted(
+                zip(run_dirs, runs), key=lambda dir_and_run: dir_and_run[0]
+            )
+        ]
         return cls(
             runs=runs,
             aggregated_run=aggregated_run_report,
@@ -625,19 +798,18 @@ class StackLevelReport:
             )
         hostname = subdirs[0]
         configs_dir = os.path.join(dir_path, hostname)
-        config_reports = list(
-            sorted(
-                (
-                    ConfigReport.from_dir(
-                        dir_path=os.path.join(configs_dir, config_dir),
-                        stats=stats,
-                    )
-                    for config_dir in os.listdir(configs_dir)
-                    if os.path.isdir(os.path.join(configs_dir, config_dir))
+        config_dirs = [
+            os.path.join(configs_dir, config_dir)
+            for config_dir in os.listdir(configs_dir)
+            if os.path.isdir(os.path.join(configs_dir, config_dir))
+        ]
+        with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as executor:
+            config_reports = sorted(
+                executor.map(
+                    partial(ConfigReport.from_dir, stats=stats), config_dirs
                 ),
                 key=lambda cr: str(cr.config),
             )
-        )
 
         return cls(
             hostname=hostname,
@@ -715,8 +887,12 @@ class SnapshotReport:
         )
 
 
-def iter_data(file_path: str, stat: Stat) -> Iterator[Tuple[int, float]]:
+def load_data(file_path: str, stat: Stat) -> np.ndarray:
     """
+    Returns an array with the mean value of the samples for each time bucket
+    (BUCKETS_PER_SEC per second, see BUCKETS), buckets without samples have
+    the value NO_SAMPLES.
+
     From fio man page:
     LOG FILE FORMATS
         Fio supports a variety of log file formats, for logging latencies,
@@ -762,72 +938,62 @@ def iter_data(file_path: str, stat: Stat) -> Iterator[Tuple[int, float]]:
         always contain 0.
     """
     # 60 seconds test run is up to 60.000 samples (1/ms), +1 xd
+    with open(file_path, "rb") as data_fd:
+        raw_data = data_fd.read()
+
+    # decompress in one go instead of line by line
     if file_path.endswith(".gz"):
-        open_fn = gzip.open
-    else:
-        open_fn = open
-
-    buckets_per_sec = 10
-    # buckets per second, for 60 sec test duration, plus some (tests might
-    # end right after 60s)
-    max_bucket = 60 * buckets_per_sec + 10
-    cur_bucket = 0
-    cur_bucket_value = 0
-    num_values_in_bucket = 0
-    for line in open_fn(file_path, "rt").readlines():
-        # latency format is:
-        # time/tick, latency_nanoseconds, read(0)/write(1), size
-        time_str_ms, value, _ = [elem.strip() for elem in line.split(",", 2)]
-        # we get ms, we want deciseconds (10 buckets/second)
-        time_bucket = int(time_str_ms) // (1000 / buckets_per_sec)
-
-        while time_bucket > cur_bucket and cur_bucket < max_bucket:
-            yield (cur_bucket, cur_bucket_value)
-            # flag buckets without any samples so we can filter later
-            cur_bucket_value = NO_SAMPLES
-            num_values_in_bucket = 0
-            cur_bucket += 1
-
-        if cur_bucket >= max_bucket:
-            break
-
-        # mean of the values inside the bucket
-        num_values_in_bucket += 1
-        if stat == Stat.iops:
-            new_value = int(value)
-        elif stat == Stat.latency:
-            new_value = int(value) * NANO_TO_MILI
-        elif stat == Stat.bandwidth:
-            new_value = int(value) * KILO_TO_MEGA
-
-        cur_bucket_value = (
-            cur_bucket_value * (num_values_in_bucket - 1) + new_value
-        ) / num_values_in_bucket
+        raw_data = gunzip(raw_data)
+
+    # we only care about the time and the value columns
+    samples = np.loadtxt(
+        io.BytesIO(raw_data),
+        delimiter=",",
+        usecols=(0, 1),
+        dtype=np.int64,
+        ndmin=2,
+    )
 
+    values = _bucketize(
+        times_ms=samples[:, 0], values=samples[:, 1] * STAT_SCALES[stat]
+    )
     logging.debug(
-        f"Got {cur_bucket} (max_bucket={max_bucket}) buckets from {file_path}"
+        f"Got {np.count_nonzero(values != NO_SAMPLES)} "
+        f"(max_bucket={MAX_BUCKET}) buckets with samples from {file_path}"
     )
-    yield (cur_bucket, cur_bucket_value)
+    return values
 
-    # pad with 0s, so we have arrays of the same shape/dimension to operate
-    # with
-    while cur_bucket < max_bucket:
-        cur_bucket += 1
-        yield cur_bucket, NO_SAMPLES
 
+def _bucketize(times_ms: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Returns the mean of the values that fall in each time bucket.
+
+    The times are expected to be sorted, as fio writes them.
+    """
+    time_buckets = times_ms // BUCKET_MS
+    # the last bucket is never filled, it marks the end of the data
+    in_range = time_buckets < MAX_BUCKET
+    time_buckets = time_buckets[in_range]
+
+    # mean of the values inside each bucket
+    bucket_sums = np.bincount(
+        time_buckets, weights=values[in_range], minlength=MAX_BUCKET + 1
+    )
+    bucket_counts = np.bincount(time_buckets, minlength=MAX_BUCKET + 1)
+
+    # pad with NO_SAMPLES, so we have arrays of the same shape/dimension to
+    # operate with, and we can filter the buckets without samples later
+    bucket_means = np.full(MAX_BUCKET + 1, NO_SAMPLES, dtype=np.float32)
+    np.divide(
+        bucket_sums, bucket_counts, out=bucket_means, where=bucket_counts > 0
+    )
+    return bucket_means
 
-def get_new_figure(stat: Stat, num_runs: int) -> Figure:
-    if stat == Stat.latency:
-        y_label = "latency(ms)"
-    elif stat == Stat.bandwidth:
-        y_label = "bandwidth(MiB/s)"
-    elif stat == Stat.iops:
-        y_label = "iops"
 
+def get_new_figure(stat: Stat, num_runs: int) -> Figure:
     return figure(
         title=f"{stat.name} - max/mean/min of #{num_runs} runs",
         x_axis_label="time(s)",
-        y_axis_label=y_label,
+        y_axis_label=STAT_Y_LABELS[stat],
     )
 
 
@@ -839,69 +1005,33 @@ def add_stat_aggregated_run_lines(
     target_name: str,
     stat: Stat,
 ) -> None:
+    # all the lines in a single glyph, so bokeh has only one renderer and data
+    # source per figure to build
+    xs: List[np.ndarray] = []
+    ys: List[np.ndarray] = []
+    colors: List[str] = []
+    dash_patterns: List[str] = []
     for aggregation_type in AggregationType:
-        base_stat_report = getattr(
-            base_run, f"{aggregation_type.name}_{stat.name}_report"
-        )
-        target_stat_report = getattr(
-            target_run, f"{aggregation_type.name}_{stat.name}_report"
-        )
         if aggregation_type == AggregationType.mean:
             dash_pattern = "solid"
         else:
             dash_pattern = "dotted"
 
-        add_stat_aggregated_run_line(
-            figure=figure,
-            run_stat_report=base_stat_report,
-            color="blue",
-            dash_pattern=dash_pattern,
-        )
-        add_stat_aggregated_run_line(
-            figure=figure,
-            run_stat_report=target_stat_report,
-            color="red",
-            dash_pattern=dash_pattern,
-        )
-
-
-def add_stat_aggregated_run_line(
-    figure: Figure,
-    run_stat_report: AggregatedRunStatReport,
-    color: str,
-    dash_pattern: str,
-) -> None:
-    figure.line(
-        x=(
-            run_stat_report.data["f0"][
-                run_stat_report.data["f1"] != NO_SAMPLES
-            ]
-            / 10
-        ),
-        y=run_stat_report.data["f1"][run_stat_report.data["f1"] != NO_SAMPLES],
-        line_color=color,
+        for run, color in ((base_run, "blue"), (target_run, "red")):
+            run_stat_report = getattr(
+                run, f"{aggregation_type.name}_{stat.name}_report"
+            )
+            xs.append(run_stat_report.plot_x)
+            ys.append(run_stat_report.plot_y)
+            colors.append(color)
+            dash_patterns.append(dash_pattern)
+
+    figure.multi_line(
+        xs=xs,
+        ys=ys,
+        line_color=colors,
         line_width=2,
-        line_dash=dash_pattern,
-    )
-
-
-def add_hover_tooltip(figure_obj: Figure, stat: Stat) -> None:
-    return
-    if stat == Stat.latency:
-        y_label = "latency"
-    elif stat == Stat.bandwidth:
-        y_label = "bandwidth"
-    elif stat == Stat.iops:
-        y_label = "iops"
-
-    figure_obj.add_tools(
-        HoverTool(
-            tooltips=[
-                # ("time", "@x"),
-                (y_label, "@y"),
-            ],
-            mode="vline",
-        )
+        line_dash=dash_patterns,
     )
 
 
@@ -936,65 +1066,31 @@ def _get_stat_table(
     base_is_better_fn: Callable[..., bool],
     config: RunConfig,
     with_ninety_percentile: bool = False,
-) -> None:
-    if base_stats.stat == Stat.iops:
-        unit = "iops"
-    elif base_stats.stat == Stat.bandwidth:
-        unit = "Mb/s"
-    elif base_stats.stat == Stat.latency:
-        unit = "ms"
-
-    ninety_percent_row = ""
+) -> Div:
+    unit = STAT_UNITS[base_stats.stat]
+    row_names = STAT_TABLE_ROWS
     if with_ninety_percentile:
-        ninety_percent_row = _get_table_row(
-            stat_name="ninety_percentile",
-            units=unit,
-            base_value=base_stats.ninety_percentile,
-            target_value=target_stats.ninety_percentile,
+        row_names = row_names + ("ninety_percentile",)
+
+    rows = "".join(
+        _get_table_row(
+            stat_name=row_name,
+            # the stddev is shown without units
+            units="" if row_name == "stddev" else unit,
             base_is_better_fn=base_is_better_fn,
+            base_value=getattr(base_stats, row_name),
+            target_value=getattr(target_stats, row_name),
         )
-
+        for row_name in row_names
+    )
     return Div(
-        text=f"""
-        {base_stats.stat.name} - {config}
-        <table width="100%">
-            <tr>
-                <th></th>
-                <th style="color:blue;">{base_name}</th>
-                <th style="color:red;">{target_name}</th>
-            </tr>
-            {_get_table_row(
-                stat_name="mean",
-                units=unit,
-                base_is_better_fn=base_is_better_fn,
-                base_value=base_stats.mean,
-                target_value=target_stats.mean,
-            )}
-            {_get_table_row(
-                stat_name="max",
-                units=unit,
-                base_is_better_fn=base_is_better_fn,
-                base_value=base_stats.max,
-                target_value=target_stats.max,
-            )}
-            {_get_table_row(
-                stat_name="min",
-                units=unit,
-                base_is_better_fn=base_is_better_fn,
-                base_value=base_stats.min,
-                target_value=target_stats.min,
-            )}
-            {_get_table_row(
-                stat_name="stddev",
-                units="",
-                base_is_better_fn=base_is_better_fn,
-                base_value=base_stats.stddev,
-                target_value=target_stats.stddev,
-            )}
-            {ninety_percent_row}
-        </table>
-        <div style="color:grey;">*As given by fio</div>
-        """,
+        text=STAT_TABLE_TEMPLATE.format(
+            stat_name=base_stats.stat.name,
+            config=config,
+            base_name=base_name,
+            target_name=target_name,
+            rows=rows,
+        ),
         style=DEFAULT_STYLE,
     )
 
@@ -1021,19 +1117,8 @@ def get_run_comparative_report_tab(
             target_name=target_name,
             stat=stat,
         )
-        add_hover_tooltip(figure_obj=new_figure, stat=stat)
 
         config_figures.append(new_figure)
-        if stat.name == "latency":
-
-            def _base_is_better(base_value, target_value) -> bool:
-                return base_value < target_value
-
-        else:
-
-            def _base_is_better(base_value, target_value) -> bool:
-                return base_value > target_value
-
         config_figures.append(
             _get_stat_table(
                 base_name=base_name,
@@ -1041,13 +1126,13 @@ def get_run_comparative_report_tab(
                 target_name=target_name,
                 target_stats=getattr(target_run.aggregated_stats, stat.name),
                 with_ninety_percentile=(stat.name == "latency"),
-                base_is_better_fn=_base_is_better,
+                base_is_better_fn=STAT_BASE_IS_BETTER[stat],
                 config=config,
             )
         )
 
     return Panel(
-        child=gridplot(children=config_figures, ncols=2, merge_tools=False),
+        child=gridplot(children=config_figures, ncols=2, merge_tools=True),
         title=f"{config}",
     )
 
@@ -1059,12 +1144,23 @@ def compare_level_reports(
     target_report: StackLevelReport,
     target_report_name: str,
 ) -> Plot:
+    # only compares the configs of each side (see StackLevelReport.__eq__)
     if base_report != target_report:
+        # the configs are enough to tell what's different, formatting the
+        # whole reports is slow and unreadable
+        base_configs = [
+            str(config_report.config)
+            for config_report in base_report.config_reports
+        ]
+        target_configs = [
+            str(config_report.config)
+            for config_report in target_report.config_reports
+        ]
         raise Exception(
-            f"There's different reports in the taget directory "
+            f"There's different reports in the target directory "
             f"than in the base directory: \n"
-            f"Base reports: {pformat(base_report)}\n"
-            f"Target reports:{pformat(target_report)}"
+            f"Base report configs: {pformat(base_configs)}\n"
+            f"Target report configs: {pformat(target_configs)}"
         )
 
     tabs = []
@@ -1094,20 +1190,19 @@ def compare_snapshot_reports(
 ) -> Plot:
     level_report_figures = [
         Panel(
-            title=f"{before_satck_report.stack_level.name}",
+            title=f"{before_stack_report.stack_level.name}",
             child=column(
                 Div(
-                    text=(
-                        STACK_LEVEL_DESCS[before_satck_report.stack_level]
-                        + COMMON_DESC
-                    ),
+                    text=STACK_LEVEL_DIV_TEXTS[
+                        before_stack_report.stack_level
+                    ],
                     style=DEFAULT_STYLE,
                 ),
                 compare_level_reports(
                     stats=stats,
-                    base_report=before_satck_report,
+                    base_report=before_stack_report,
                     base_report_name=(
-                        f"{before_satck_report.stack_level.name} - before"
+                        f"{before_stack_report.stack_level.name} - before"
                     ),
                     target_report=after_stack_report,
                     target_report_name=(
@@ -1116,7 +1211,7 @@ def compare_snapshot_reports(
                 ),
             ),
         )
-        for (before_satck_report, after_stack_report) in zip(
+        for (before_stack_report, after_stack_report) in zip(
             before.stack_level_reports, after.stack_level_reports
         )
     ]
@@ -1132,6 +1227,34 @@ def compare_snapshot_reports(
     )
 
 
+def set_output_file(output_file_name: str, js_mode: str) -> None:
+    """Makes show() save the report to output_file_name, including BokehJS as
+    js_mode says.
+
+    With the relative mode BokehJS is copied next to the report (only if it's
+    not there already), and the report loads it from there, so it can be
+    used offline without embedding it in each report.
+    """
+    if js_mode != "relative":
+        output_file(output_file_name, mode=js_mode)
+        return
+
+    report_dir = os.path.dirname(os.path.realpath(output_file_name))
+    bokehjs_dir = os.path.join(report_dir, BOKEHJS_DIR)
+    js_dir = os.path.join(bokehjs_dir, "js")
+    os.makedirs(js_dir, exist_ok=True)
+    for js_file in Resources(mode="absolute").js_files:
+        js_copy = os.path.join(js_dir, os.path.basename(js_file))
+        if not os.path.exists(js_copy):
+            shutil.copyfile(js_file, js_copy)
+
+    output_file(output_file_name)
+    # output_file can't point the relative paths to our copy
+    curstate().file.resources = Resources(
+        mode="relative", root_dir=report_dir, base_dir=bokehjs_dir
+    )
+
+
 @click.option("-v", "--verbose", is_flag=True)
 @click.group()
 def cli(verbose: bool):
@@ -1158,7 +1281,7 @@ def cli(verbose: bool):
     help="Stack level for which the report is being generated.",
     required=False,
     default=StackLevel.rbd_from_osd.name,
-    type=click.Choice([stack_level.name for stack_level in StackLevel]),
+    type=click.Choice(STACK_LEVEL_NAMES),
 )
 @click.option(
     "--stat",
@@ -1168,8 +1291,19 @@ def cli(verbose: bool):
         "default."
     ),
     multiple=True,
-    default=[stat.name for stat in Stat],
-    type=click.Choice([stat.name for stat in Stat]),
+    default=STAT_NAMES,
+    type=click.Choice(STAT_NAMES),
+)
+@click.option(
+    "--js-mode",
+    help=(
+        "How to include BokehJS in the report, 'inline' embeds it so the "
+        "report is self contained, 'cdn' loads it from cdn.bokeh.org "
+        "instead (about 1MB smaller report), and 'relative' copies it once "
+        f"to {BOKEHJS_DIR} next to the report and loads it from there."
+    ),
+    default="inline",
+    type=click.Choice(JS_MODES),
 )
 def level_report(
     outfile_prefix: str,
@@ -1179,12 +1313,13 @@ def level_report(
     target_report_name: str,
     stack_level_name: str,
     stat_names: List[str],
+    js_mode: str,
 ):
     stats = [Stat[stat_name] for stat_name in stat_names]
     stack_level = StackLevel[stack_level_name]
     output_file_name = f"{outfile_prefix}.html"
     click.echo(f"Building comparative report at {output_file_name}...")
-    output_file(output_file_name, mode="inline")
+    set_output_file(output_file_name=output_file_name, js_mode=js_mode)
     curdoc().theme = "dark_minimal"
     base_report = StackLevelReport.from_dir(
         stack_level=stack_level, dir_path=base_directory, stats=stats
@@ -1224,8 +1359,8 @@ def level_report(
     "stack_level_names",
     help="Stack level for which the report is being generated.",
     multiple=True,
-    default=[stack_level.name for stack_level in StackLevel],
-    type=click.Choice([stack_level.name for stack_level in StackLevel]),
+    default=STACK_LEVEL_NAMES,
+    type=click.Choice(STACK_LEVEL_NAMES),
 )
 @click.option(
     "--stat",
@@ -1235,14 +1370,25 @@ def level_report(
         "default."
     ),
     multiple=True,
-    default=[stat.name for stat in Stat],
-    type=click.Choice([stat.name for stat in Stat]),
+    default=STAT_NAMES,
+    type=click.Choice(STAT_NAMES),
 )
 @click.option(
     "--description",
     help=("Short text describing the report itself, to give some context."),
     default="",
 )
+@click.option(
+    "--js-mode",
+    help=(
+        "How to include BokehJS in the report, 'inline' embeds it so the "
+        "report is self contained, 'cdn' loads it from cdn.bokeh.org "
+        "instead (about 1MB smaller report), and 'relative' copies it once "
+        f"to {BOKEHJS_DIR} next to the report and loads it from there."
+    ),
+    default="inline",
+    type=click.Choice(JS_MODES),
+)
 def env_report(
     outfile_prefix: str,
     before_data_dir: str,
@@ -1250,13 +1396,14 @@ def env_report(
     stack_level_names: List[str],
     stat_names: List[str],
     description: str,
+    js_mode: str,
 ):
     stats = [Stat[stat_name] for stat_name in stat_names]
     stack_levels = [StackLevel[level_name] for level_name in stack_level_names]
 
     output_file_name = f"{outfile_prefix}.html"
     click.echo(f"Building comparative report at {output_file_name}...")
-    output_file(output_file_name, mode="inline")
+    set_output_file(output_file_name=output_file_name, js_mode=js_mode)
     curdoc().theme = "dark_minimal"
     if before_data_dir.endswith("/"):
         before_data_dir = before_data_dir[:-1]
@@ -1285,9 +1432,9 @@ def env_report(
     )
 
     before_metadata_path = os.path.join(before_data_dir, "metadata.json")
-    before_metadata = json.loads(open(before_metadata_path).read())
+    before_metadata = load_json_file(before_metadata_path)
     after_metadata_path = os.path.join(after_data_dir, "metadata.json")
-    after_metadata = json.loads(open(after_metadata_path).read())
+    after_metadata = load_json_file(after_metadata_path)
     metadata = {
         "creation_time": datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S'),
         "report_file": output_file_name,
@@ -1304,8 +1451,7 @@ def env_report(
     }
 
     report_metadata_path = os.path.realpath(outfile_prefix + ".metadata.json")
-    with open(report_metadata_path, 'w') as report_metadata_fd:
-        report_metadata_fd.write(json.dumps(metadata, indent=4))
+    dump_json_file(data=metadata, file_path=report_metadata_path)
 
     show(column(desc_div, full_report))
 
@@ -2,9 +2,16 @@
 import os
 import click
 import requests
-import json
-from typing import Any, Dict, List, Optional
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 from enum import Enum, auto
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 
 DEFAULT_CONFIG_PATH = os.path.expanduser("~/.config/netbox/config.json")
@@ -12,12 +19,37 @@ DEFAULT_CONFIG = {
     "netbox_url": "https://netbox.local/api",
     "api_token": "IMADUMMYTOKEN",
 }
+# connect and read timeouts for the netbox api, in seconds
+NETBOX_TIMEOUT = (3, 30)
+# results per page, netbox caps it to its MAX_PAGE_SIZE (1000 by default)
+NETBOX_PAGE_SIZE = 1000
+
+
+def _get_session() -> requests.Session:
+    session = requests.Session()
+    # netbox is sometimes restarted/reloaded behind the proxy
+    adapter = HTTPAdapter(
+        max_retries=Retry(
+            total=3, backoff_factor=0.2, status_forcelist=[502, 503, 504]
+        )
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# shared by all the calls of the process, so the connection (and the tls
+# handshake) is reused between them, requests already asks for gzip
+SESSION = _get_session()
 
 
 class EntityType(Enum):
     devices = auto()
 
 
+ENTITY_TYPE_NAMES = tuple(entity_type.name for entity_type in EntityType)
+
+
 def device_to_str(
     device_dict: Dict[str, Any], domain: Optional[str] = None
 ) -> str:
@@ -37,17 +69,57 @@ def get_hosts(
     entity_type: EntityType,
     search_query: str,
 ) -> List[Dict[str, Any]]:
-    response = requests.get(
-        url=f"{netbox_url}/dcim/{entity_type.name}/",
-        params={"q": search_query},
-        headers={"Authorization": f"Token {api_token}"},
+    results: List[Dict[str, Any]] = []
+    url = f"{netbox_url}/dcim/{entity_type.name}/"
+    params: Optional[Dict[str, Any]] = {
+        "q": search_query,
+        "limit": NETBOX_PAGE_SIZE,
+    }
+    # the results are paginated, follow the pages until the last one
+    while url:
+        response = SESSION.get(
+            url=url,
+            params=params,
+            headers={"Authorization": f"Token {api_token}"},
+            timeout=NETBOX_TIMEOUT,
+        )
+        response.raise_for_status()
+        page = json_loads(response.content)
+        results.extend(page["results"])
+        # the next url already carries the query parameters
+        url = page["next"]
+        params = None
+
+    return results
+
+
+@lru_cache(maxsize=64)
+def get_hosts_cached(
+    netbox_url: str,
+    api_token: str,
+    entity_type: EntityType,
+    search_query: str,
+) -> Tuple[Dict[str, Any], ...]:
+    """Same as get_hosts, but queries netbox only once per process for the
+    same parameters.
+
+    The returned hosts are shared between callers, don't modify them.
+    """
+    return tuple(
+        get_hosts(
+            netbox_url=netbox_url,
+            api_token=api_token,
+            entity_type=entity_type,
+            search_query=search_query,
+        )
     )
-    response.raise_for_status()
-    return response.json()["results"]
 
 
+# every random host lookup loads it, and it does not change during a run
+@lru_cache(maxsize=4)
 def load_config_file(config_path: str = DEFAULT_CONFIG_PATH) -> Dict[str, str]:
-    return json.load(open(config_path))
+    with open(config_path, "rb") as config_fd:
+        return json_loads(config_fd.read())
 
 
 @click.command()
@@ -61,7 +133,7 @@ def load_config_file(config_path: str = DEFAULT_CONFIG_PATH) -> Dict[str, str]:
     "-e",
     "--entity",
     default=EntityType.devices.name,
-    type=click.Choice([entity_type.name for entity_type in EntityType]),
+    type=click.Choice(ENTITY_TYPE_NAMES),
     help="Type of entity to search for.",
 )
 @click.argument("search_query")
@@ -0,0 +1,124 @@
+import logging
+import socket
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+
+SSH_PORT = 22
+SSH_CONNECT_TIMEOUT_SECS = 3
+# the wait between attempts doubles each time, from the first to the max
+FIRST_BACKOFF_SECS = 2
+MAX_BACKOFF_SECS = 30
+# exit status of ssh itself failing (as opposed to the remote command)
+SSH_ERROR_EXIT_CODE = 255
+HOST_KEY_FAILED_MESSAGE = "Host key verification failed"
+# printed by puppet when another run (ex. the first boot one) holds its lock
+PUPPET_LOCKED_MESSAGE = "already in progress"
+# Reuse one ssh connection per host for all the commands we run on it (and
+# between runs, for a minute), instead of a new handshake each time. %C is a
+# hash of the connection details, and ssh expands the ~ itself. The path is
+# kept short and per user (unix socket paths are limited to ~100 chars on
+# macOS), execute_remote_test.sh uses the same one.
+SSH_OPTIONS = [
+    "-o",
+    "ControlMaster=auto",
+    "-o",
+    "ControlPath=~/.ssh/cloud-perf-%C",
+    "-o",
+    "ControlPersist=60s",
+]
+
+
+def backoff_secs(attempt: int) -> int:
+    return min(MAX_BACKOFF_SECS, FIRST_BACKOFF_SECS * 2 ** attempt)
+
+
+def wait_for_ssh(host: str, deadline: float) -> None:
+    """Waits until the host accepts connections on the ssh port.
+
+    The deadline is a time.monotonic() timestamp, raises TimeoutError if the
+    host is not reachable by then.
+    """
+    attempt = 0
+    while True:
+        try:
+            with socket.create_connection(
+                (host, SSH_PORT), timeout=SSH_CONNECT_TIMEOUT_SECS
+            ):
+                return
+
+        except OSError as error:
+            if time.monotonic() > deadline:
+                raise TimeoutError(
+                    f"Timed out waiting for {host} to accept ssh connections."
+                ) from error
+
+        logging.info(f"Waiting for {host} to come online...")
+        time.sleep(backoff_secs(attempt))
+        attempt += 1
+
+
+def _run_teed(command: List[str]) -> Tuple[int, str]:
+    """Runs the command passing its output (stderr merged into stdout) through
+    as it comes, returns its exit code and the whole output.
+    """
+    output_lines: List[str] = []
+    with subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors="replace",
+    ) as process:
+        for line in process.stdout:
+            sys.stdout.write(line)
+            sys.stdout.flush()
+            output_lines.append(line)
+
+    return process.returncode, "".join(output_lines)
+
+
+def run_when_ready(host: str, command: List[str], deadline: float) -> None:
+    """Runs the command on the host through ssh once it's reachable.
+
+    Only failures to get the command running are retried, until the deadline
+    (a time.monotonic() timestamp) passes: ssh not letting us in yet, or
+    puppet already running. The host key of new hosts is accepted, but a host
+    key mismatch fails right away, as does the command failing.
+    """
+    attempt = 0
+    while True:
+        wait_for_ssh(host=host, deadline=deadline)
+        ssh_command = [
+            "ssh",
+            *SSH_OPTIONS,
+            "-o",
+            "BatchMode=yes",
+            # a freshly created VM always has an unknown host key
+            "-o",
+            "StrictHostKeyChecking=accept-new",
+            host,
+            *command,
+        ]
+        logging.debug(f"Running command {ssh_command}")
+        # keep the output to tell the retryable errors apart
+        returncode, output = _run_teed(ssh_command)
+        if returncode == 0:
+            return
+
+        error = subprocess.CalledProcessError(
+            returncode=returncode, cmd=ssh_command, output=output
+        )
+        if returncode == SSH_ERROR_EXIT_CODE:
+            retryable = HOST_KEY_FAILED_MESSAGE not in output
+        else:
+            retryable = PUPPET_LOCKED_MESSAGE in output
+
+        if not retryable or time.monotonic() > deadline:
+            raise error
+
+        logging.info(f"Command {command} failed on {host}, retrying...")
+        time.sleep(backoff_secs(attempt))
+        attempt += 1
@@ -11,14 +11,21 @@ from typing import Any, Callable, Dict, List, Optional
 from enum import Enum
 from dataclasses import dataclass
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
-from generate_reports import StackLevel
+from generate_reports import (
+    STACK_LEVEL_NAMES,
+    StackLevel,
+    dump_json_file,
+    load_json_file,
+)
 from get_hosts_from_netbox import (
     load_config_file,
-    get_hosts,
+    get_hosts_cached,
     device_to_str,
     EntityType,
 )
+from remote_host import SSH_OPTIONS, run_when_ready
 
 SCRIPT_DIR = os.path.realpath(os.path.dirname(__file__))
 
@@ -28,6 +35,9 @@ class Site(Enum):
     eqiad = "eqiad1"
 
 
+SITE_NAMES = tuple(site.name for site in Site)
+
+
 def check_call(command: List[str]) -> int:
     logging.debug(f"Running command {command}")
     return subprocess.check_call(command)
@@ -37,28 +47,38 @@ def get_random_netbox_host_with_info(
     hosts_query: str, site: Site, domain: Optional[str] = None
 ) -> List[str]:
     netbox_config = load_config_file()
-    all_matching_hostinfos = [
-        {
-            "fqdn": device_to_str(device_dict, domain=domain),
-            "model": device_dict["device_type"]["model"],
-            "rack": device_dict["rack"]["name"],
-        }
-        for device_dict in get_hosts(
-            netbox_url=netbox_config["netbox_url"],
-            api_token=netbox_config["api_token"],
-            entity_type=EntityType.devices,
-            search_query=hosts_query,
-        )
-        if device_dict["site"]["slug"] == site.name
-        and device_dict["status"]["value"] == "active"
-    ]
-    if len(all_matching_hostinfos) < 1:
+    # pick one of the matching devices uniformly in a single pass (reservoir
+    # sampling), so we only build the host info for the chosen one
+    chosen_device = None
+    num_matching = 0
+    # the stack levels (and the openstack control host) might query the
+    # same hosts
+    for device_dict in get_hosts_cached(
+        netbox_url=netbox_config["netbox_url"],
+        api_token=netbox_config["api_token"],
+        entity_type=EntityType.devices,
+        search_query=hosts_query,
+    ):
+        if (
+            device_dict["site"]["slug"] != site.name
+            or device_dict["status"]["value"] != "active"
+        ):
+            continue
+
+        num_matching += 1
+        if random.randrange(num_matching) == 0:
+            chosen_device = device_dict
+
+    if chosen_device is None:
         raise Exception(
             f"Unable to get enough hosts matching '{hosts_query}' for site "
-            f"'{site.name}', need 1 but got "
-            f"{len(all_matching_hostinfos)}."
+            f"'{site.name}', need 1 but got {num_matching}."
         )
-    return random.choice(all_matching_hostinfos)
+    return {
+        "fqdn": device_to_str(chosen_device, domain=domain),
+        "model": chosen_device["device_type"]["model"],
+        "rack": chosen_device["rack"]["name"],
+    }
 
 
 def get_os_run(
@@ -75,6 +95,7 @@ def get_os_run(
     def _run_os(*command_args) -> Dict[str, Any]:
         command = [
             "ssh",
+            *SSH_OPTIONS,
             control_host,
             "sudo",
             "wmcs-openstack",
@@ -95,10 +116,17 @@ def get_performance_vm(site: Site) -> List[str]:
     performance_vm_name = "performance-test"
     performance_project = "testlabs"
     os_run = get_os_run(project=performance_project, site=site)
+    # let openstack do the filtering, instead of listing all the project VMs
+    list_performance_vm_args = (
+        "server",
+        "list",
+        "--name",
+        f"^{performance_vm_name}$",
+    )
     performance_vm_info = next(
         (
             vm_info
-            for vm_info in os_run("server", "list")
+            for vm_info in os_run(*list_performance_vm_args)
             if vm_info["Name"] == performance_vm_name
         ),
         None,
@@ -126,42 +154,32 @@ def get_performance_vm(site: Site) -> List[str]:
             "--wait",
         )
 
-        waitfor = 60 * 15  # 15 minutes
-        ran_puppet = False
-        start_time = time.time()
-        while not ran_puppet:
-            try:
-                check_call(
-                    [
-                        "ssh",
-                        performance_vm_fqdn,
-                        "sudo",
-                        "run-puppet-agent",
-                    ]
-                )
-            except Exception:
-                cur_time = time.time()
-                if (cur_time - start_time) > waitfor:
-                    logging.error(
-                        f"Unable to spin up the vm {performance_vm_name} "
-                        f"(project: {performance_project}, "
-                        f"site: {site.name}), timed out waiting for puppet to "
-                        "run."
-                    )
-                    raise
-
-                logging.info(
-                    f"Waiting for the VM {performance_vm_fqdn} to come online "
-                    "and do a full puppet run..."
-                )
-                time.sleep(60)
-                continue
-
-            ran_puppet = True
+        logging.info(
+            f"Waiting for the VM {performance_vm_fqdn} to come online "
+            "and do a full puppet run..."
+        )
+        # only runs puppet once the VM is reachable, instead of using the
+        # (slow) puppet run itself to probe for it
+        deadline = time.monotonic() + 60 * 15  # 15 minutes
+        try:
+            run_when_ready(
+                host=performance_vm_fqdn,
+                command=["sudo", "run-puppet-agent"],
+                deadline=deadline,
+            )
+        except Exception:
+            logging.error(
+                f"Unable to spin up the vm {performance_vm_name} "
+                f"(project: {performance_project}, "
+                f"site: {site.name}), timed out waiting for puppet to "
+                "run."
+            )
+            raise
 
         check_call(
             [
                 "ssh",
+                *SSH_OPTIONS,
                 performance_vm_fqdn,
                 "sudo",
                 "apt",
@@ -176,7 +194,7 @@ def get_performance_vm(site: Site) -> List[str]:
             performance_vm_info = next(
                 (
                     vm_info["Name"]
-                    for vm_info in os_run("server", "list")
+                    for vm_info in os_run(*list_performance_vm_args)
                     if vm_info["Name"] == performance_vm_name
                 )
             )
@@ -253,14 +271,14 @@ STACK_LEVEL_CONFIG_PER_SITE = {
     "-s",
     "--site-name",
     required=True,
-    type=click.Choice([site.name for site in Site]),
+    type=click.Choice(SITE_NAMES),
 )
 @click.option(
     "-l",
     "--stack-level",
     multiple=True,
-    default=[stack_level.name for stack_level in StackLevel],
-    type=click.Choice([stack_level.name for stack_level in StackLevel]),
+    default=STACK_LEVEL_NAMES,
+    type=click.Choice(STACK_LEVEL_NAMES),
 )
 @click.option(
     "-v",
@@ -310,6 +328,7 @@ def cli(
         "tests": {},
     }
 
+    wanted_stack_levels = []
     for stack_level in STACK_TO_HOST_INFO.keys():
         if stack_level not in stack_levels:
             logging.debug(
@@ -318,7 +337,21 @@ def cli(
             )
             continue
 
-        hostinfo = STACK_TO_HOST_INFO[stack_level](site=site)
+        wanted_stack_levels.append(stack_level)
+
+    # Getting the hosts ready can take a while (ex. creating the performance
+    # VM and waiting for puppet), so do that for all the levels at once. The
+    # tests themselves still run one after the other, as they all hit the
+    # same ceph cluster and would skew each other's results.
+    with ThreadPoolExecutor(max_workers=len(STACK_TO_HOST_INFO)) as executor:
+        hostinfos = list(
+            executor.map(
+                lambda stack_level: STACK_TO_HOST_INFO[stack_level](site=site),
+                wanted_stack_levels,
+            )
+        )
+
+    for stack_level, hostinfo in zip(wanted_stack_levels, hostinfos):
         logging.info(f"Running {stack_level.name} tests on host {hostinfo['fqdn']}.")
         execute_remote_test(
             host=hostinfo['fqdn'],
@@ -327,15 +360,18 @@ def cli(
             base_outdir=outdir,
             num_passes=num_passes,
         )
-        with open(os.path.join(outdir, f"{stack_level.name}/{hostinfo['fqdn']}/metadata.json")) as metadata_fd:
-            metadata = json.loads(metadata_fd.read())
+        metadata = load_json_file(
+            os.path.join(outdir, f"{stack_level.name}/{hostinfo['fqdn']}/metadata.json")
+        )
 
         metadata["host_info"] = hostinfo
         run_metadata["tests"][stack_level.name] = metadata
 
     run_metadata["duration_secs"] = time.time() - start_time
-    with open(os.path.join(outdir, "metadata.json"), 'w') as metadata_fd:
-        metadata_fd.write(json.dumps(run_metadata, indent=4))        
+    dump_json_file(
+        data=run_metadata, file_path=os.path.join(outdir, "metadata.json")
+    )
+
 
 if __name__ == "__main__":
     cli()